@@ -1,89 +1,268 @@
 import numpy as np
 from typing import List, Tuple, Dict
-import networkx as nx
+from numba import njit
+
+
+@njit(cache=True, fastmath=True)
+def _spfa(amount, pred, indptr, neighbors, rates, start):
+    """
+    Shortest Path Faster Algorithm (queue-based Bellman-Ford) over a CSR adjacency,
+    relaxing in product space: amount[v] is the best amount of v reachable from
+    one unit of start, improved by amount[u] * rate instead of adding -log weights.
+    The deque uses Smallest-Label-First / Large-Label-Last ordering (largest
+    amount first). Only nodes whose amount just improved are queued, so edges
+    out of unreached nodes are never visited and the search ends once nothing changes.
+    The best path tree is kept threaded in preorder (Tarjan's subtree
+    disassembly), so a profitable cycle is caught by the relaxation that closes it.
+    Returns: a node on a profitable cycle of the predecessor array or -1.
+    """
+    n = amount.shape[0]
+    # Circular deque, a node is never queued twice at once so |V| slots suffice
+    queue = np.empty(n, dtype=np.int64)
+    in_queue = np.zeros(n, dtype=np.bool_)
+    queue[0] = start
+    in_queue[start] = True
+    head = 0
+    size = 1
+    queued_sum = amount[start]
+
+    # Preorder thread of the best path tree: next/prev links and depth
+    in_tree = np.zeros(n, dtype=np.bool_)
+    next_node = np.empty(n, dtype=np.int64)
+    prev_node = np.empty(n, dtype=np.int64)
+    depth = np.zeros(n, dtype=np.int64)
+    next_node[start] = start
+    prev_node[start] = start
+    in_tree[start] = True
+
+    while size > 0:
+        # LLL: move fronts below the mean queued amount to the back
+        for _ in range(size - 1):
+            u = queue[head]
+            if amount[u] * size >= queued_sum:
+                break
+            queue[(head + size) % n] = u
+            head = (head + 1) % n
+
+        u = queue[head]
+        head = (head + 1) % n
+        size -= 1
+        in_queue[u] = False
+        au = amount[u]
+        queued_sum = queued_sum - au if size > 0 else 0.0
+        # Disassembled while queued, the label is stale and gets improved again later
+        if not in_tree[u]:
+            continue
+
+        for k in range(indptr[u], indptr[u + 1]):
+            v = neighbors[k]
+            na = au * rates[k]
+            if na > amount[v]:
+                if in_tree[v]:
+                    if v == u:
+                        pred[v] = u
+                        return v
+                    # Drop the subtree of v, if u is in it the new edge closes a cycle
+                    x = next_node[v]
+                    while depth[x] > depth[v]:
+                        if x == u:
+                            pred[v] = u
+                            return v
+                        in_tree[x] = False
+                        x = next_node[x]
+                    next_node[prev_node[v]] = x
+                    prev_node[x] = prev_node[v]
+
+                if in_queue[v]:
+                    queued_sum += na - amount[v]
+                amount[v] = na
+                pred[v] = u
+
+                # Hang v right after its new parent in the thread
+                next_node[v] = next_node[u]
+                prev_node[next_node[u]] = v
+                next_node[u] = v
+                prev_node[v] = u
+                depth[v] = depth[u] + 1
+                in_tree[v] = True
+
+                if not in_queue[v]:
+                    # SLF: amounts larger than the front go to the front
+                    if size > 0 and na > amount[queue[head]]:
+                        head = (head - 1) % n
+                        queue[head] = v
+                    else:
+                        queue[(head + size) % n] = v
+                    in_queue[v] = True
+                    size += 1
+                    queued_sum += na
+    return -1
+
 
 class BellmanFordArbitrage:
     def __init__(self, trading_fee: float = 0.001):  # 0.1% trading fee by default
-        self.graph = nx.DiGraph()
         self.trading_fee = trading_fee
-        
+        # Fee factor applied to every rate, and its log for log-space weights
+        self._fee_factor = 1 - trading_fee
+        self._log_fee_adj = np.log1p(-trading_fee)
+        self.nodes: List[str] = []
+        self.node_index: Dict[str, int] = {}
+        # Edges as struct-of-arrays in CSR order: edge k goes src_arr[k] -> dst_arr[k]
+        # at rate w_arr[k], edges out of node u are indptr[u]:indptr[u + 1]
+        self.src_arr = np.empty(0, dtype=np.int32)
+        self.dst_arr = np.empty(0, dtype=np.int32)
+        self.w_arr = np.empty(0, dtype=np.float32)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        # Position in the pairs passed to set_pairs of each CSR edge
+        self._edge_order = np.empty(0, dtype=np.int64)
+        # Dense rate matrix, weights[u, v] = 0 when there is no edge u -> v.
+        # float32 (~7 digits) is plenty next to 0.1% fee-sized profit thresholds
+        self.weights = np.empty((0, 0), dtype=np.float32)
+
+    def set_pairs(self, pairs: List[Tuple[str, str]]):
+        """
+        Set the graph topology once, rates are filled in later by update_rates.
+        pairs: (from_currency, to_currency) of every edge
+        """
+        self.nodes = []
+        self.node_index = {}
+        for pair in pairs:
+            for curr in pair:
+                if curr not in self.node_index:
+                    self.node_index[curr] = len(self.nodes)
+                    self.nodes.append(curr)
+
+        n = len(self.nodes)
+        src = np.fromiter((self.node_index[from_curr] for from_curr, _ in pairs),
+                          dtype=np.int32, count=len(pairs))
+        dst = np.fromiter((self.node_index[to_curr] for _, to_curr in pairs),
+                          dtype=np.int32, count=len(pairs))
+        self._edge_order = np.argsort(src, kind='stable')
+        self.src_arr = src[self._edge_order]
+        self.dst_arr = dst[self._edge_order]
+        self.w_arr = np.zeros(len(pairs), dtype=np.float32)
+        self.indptr = np.searchsorted(self.src_arr, np.arange(n + 1))
+        self.weights = np.zeros((n, n), dtype=np.float32)
+
+    def update_rates(self, rates):
+        """
+        Overwrite the edge rates in place, keeping the topology from set_pairs.
+        rates: rate of every pair, in the order given to set_pairs
+        """
+        # Apply trading fee to all rates in one vectorized step
+        effective_rates = np.asarray(rates, dtype=np.float64)[self._edge_order] * self._fee_factor
+        # Pairs without a usable rate get no edge
+        self.w_arr[:] = np.where(effective_rates > 0, effective_rates, 0.0)
+        self.weights[self.src_arr, self.dst_arr] = self.w_arr
+
     def create_graph(self, exchange_rates: Dict[Tuple[str, str], float]):
         """
         Create a graph from exchange rates.
         exchange_rates: Dictionary with (from_currency, to_currency) as key and rate as value
         """
-        # Clear existing graph
-        self.graph.clear()
-        
-        # Add edges with weights as -log(rate)
-        for (from_curr, to_curr), rate in exchange_rates.items():
-            # Apply trading fee to the rate
-            effective_rate = rate * (1 - self.trading_fee)
-            # Use negative log of exchange rate as edge weight
-            if effective_rate > 0:  # Avoid log(0) or log(negative)
-                weight = -np.log(effective_rate)
-                self.graph.add_edge(from_curr, to_curr, weight=weight)
-    
+        self.set_pairs(list(exchange_rates))
+        self.update_rates(list(exchange_rates.values()))
+
     def find_arbitrage(self, start_currency: str) -> Tuple[bool, List[str], float]:
         """
-        Find arbitrage opportunity using Bellman-Ford algorithm.
+        Find arbitrage opportunity using Bellman-Ford algorithm (SPFA variant).
         Returns: (has_arbitrage, path, profit_ratio)
         """
-        if not self.graph.has_node(start_currency):
+        if start_currency not in self.node_index:
             return False, [], 1.0
-            
-        # Initialize distances
-        distances = {node: float('inf') for node in self.graph.nodes()}
-        distances[start_currency] = 0
-        predecessors = {node: None for node in self.graph.nodes()}
-        
-        # Relax edges |V| - 1 times
-        for _ in range(len(self.graph.nodes()) - 1):
-            for u, v, weight in self.graph.edges(data='weight'):
-                if distances[u] + weight < distances[v]:
-                    distances[v] = distances[u] + weight
-                    predecessors[v] = u
-        
-        # Check for negative cycle
-        for u, v, weight in self.graph.edges(data='weight'):
-            if distances[u] + weight < distances[v]:
-                # Negative cycle exists, extract the cycle
-                visited = set()
-                cycle = []
-                current = u
-                
-                while current not in visited:
-                    visited.add(current)
-                    cycle.append(current)
-                    current = predecessors[current]
-                
-                # Find start of cycle
-                start_idx = cycle.index(current)
-                arbitrage_path = cycle[start_idx:][::-1]
-                
-                # Calculate profit ratio
-                profit_ratio = 1.0
-                initial_amount = 1.0
-                current_amount = initial_amount
-                
-                # Add the start node to complete the cycle
-                arbitrage_path.append(arbitrage_path[0])
-                
-                # Calculate the actual profit ratio considering fees
-                for i in range(len(arbitrage_path)-1):
-                    # Get the raw exchange rate
-                    rate = np.exp(-self.graph[arbitrage_path[i]][arbitrage_path[i+1]]['weight'])
-                    # Apply the fee
-                    current_amount = current_amount * rate
-                
-                profit_ratio = current_amount / initial_amount
-                
-                return True, arbitrage_path, profit_ratio
-        
+
+        n = len(self.nodes)
+
+        # Initialize amounts, one unit of the start currency and nothing elsewhere
+        amounts = np.zeros(n, dtype=np.float32)
+        amounts[self.node_index[start_currency]] = 1.0
+        predecessors = np.full(n, -1, dtype=np.int32)
+
+        witness = _spfa(amounts, predecessors, self.indptr, self.dst_arr, self.w_arr,
+                        self.node_index[start_currency])
+
+        # Check for profitable cycle
+        if witness >= 0:
+            # Profitable cycle exists, extract it from the predecessors
+            current = witness
+            # Position of each node in the walk, so the cycle start is a lookup
+            pos = {}
+            cycle = []
+
+            while current not in pos:
+                pos[current] = len(pos)
+                cycle.append(current)
+                current = predecessors[current]
+
+            # Find start of cycle
+            start_idx = pos[current]
+            arbitrage_path = [self.nodes[i] for i in cycle[start_idx:][::-1]]
+
+            # Calculate profit ratio
+            profit_ratio = 1.0
+            initial_amount = 1.0
+            current_amount = initial_amount
+
+            # Add the start node to complete the cycle
+            arbitrage_path.append(arbitrage_path[0])
+
+            # Calculate the actual profit ratio considering fees
+            for i in range(len(arbitrage_path)-1):
+                # Get the fee-adjusted exchange rate
+                rate = self.get_exchange_rate(arbitrage_path[i], arbitrage_path[i+1])
+                current_amount = current_amount * rate
+
+            profit_ratio = current_amount / initial_amount
+
+            return True, arbitrage_path, profit_ratio
+
         return False, [], 1.0
 
     def get_exchange_rate(self, from_curr: str, to_curr: str) -> float:
         """Get exchange rate between two currencies"""
-        if self.graph.has_edge(from_curr, to_curr):
-            return np.exp(-self.graph[from_curr][to_curr]['weight'])
+        u = self.node_index.get(from_curr)
+        v = self.node_index.get(to_curr)
+        if u is not None and v is not None:
+            return float(self.weights[u, v])
         return 0.0
+
+    def create_log_rate_tensor(self, prices: np.ndarray,
+                               pairs: List[Tuple[str, str]]) -> Tuple[List[str], np.ndarray]:
+        """
+        Create a log-rate tensor from price snapshots over time.
+        prices: (T, S) array, column j holds the price of pairs[j] = (base, quote)
+        Returns: (currencies, log_rates) where log_rates[t, u, v] = -log(rate * (1 - fee))
+        for u -> v at snapshot t, inf where there is no pair or no price
+        """
+        currencies = list(dict.fromkeys(curr for pair in pairs for curr in pair))
+        index = {curr: i for i, curr in enumerate(currencies)}
+        n = len(currencies)
+
+        log_rates = np.full((prices.shape[0], n, n), np.inf, dtype=np.float32)
+        # Non-positive prices are no usable rate, like in create_graph
+        log_prices = np.log(np.where(prices > 0, prices, np.nan))
+        for j, (base, quote) in enumerate(pairs):
+            log_rates[:, index[base], index[quote]] = -log_prices[:, j] - self._log_fee_adj  # Sell base for quote
+            log_rates[:, index[quote], index[base]] = log_prices[:, j] - self._log_fee_adj   # Buy base with quote
+
+        # Missing prices must not open an edge
+        log_rates[np.isnan(log_rates)] = np.inf
+        return currencies, log_rates
+
+    @staticmethod
+    def min_cycle_costs(log_rates: np.ndarray, start: int, length: int = 3) -> np.ndarray:
+        """
+        Cheapest closed walk of the given length through start, for every snapshot.
+        Computed as a min-plus matrix power of log_rates, so triangles (length 3)
+        and longer cycles share the same code.
+        Returns: (T,) array of costs, a negative cost is an arbitrage opportunity
+        """
+        costs = log_rates[:, start, :]
+        for _ in range(length - 1):
+            # costs[t, v] = min over a of costs[t, a] + log_rates[t, a, v], folded in
+            # with branch-free np.minimum so no (T, V, V) temporary is built
+            step = costs[:, 0, None] + log_rates[:, 0, :]
+            for a in range(1, log_rates.shape[1]):
+                np.minimum(step, costs[:, a, None] + log_rates[:, a, :], out=step)
+            costs = step
+        return costs[:, start]
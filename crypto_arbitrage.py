@@ -12,6 +12,7 @@ import ccxt.async_support as ccxt
 import os
 import nest_asyncio
 import warnings
+from numba import njit, prange
 
 # Apply nest_asyncio to allow nested event loops
 nest_asyncio.apply()
@@ -20,16 +21,38 @@ nest_asyncio.apply()
 warnings.filterwarnings('ignore', category=DeprecationWarning, 
                        message='datetime.datetime.utcfromtimestamp.*')
 
+# Full fastmath would assume no NaNs, but missing candles are NaN
+@njit(parallel=True, cache=True, fastmath={'nsz', 'arcp', 'contract'})
+def _scan_triangles(btc_usdt, eth_usdt, eth_btc, fee, amount, out_path1, out_path2):
+    """Fill the profit of both triangle paths for every timestamp, timestamps run in parallel"""
+    fee3 = fee * fee * fee
+    for i in prange(btc_usdt.shape[0]):
+        # Path 1: USDT -> BTC -> ETH -> USDT
+        out_path1[i] = amount / btc_usdt[i] / eth_btc[i] * eth_usdt[i] * fee3 - amount
+        # Path 2: USDT -> ETH -> BTC -> USDT
+        out_path2[i] = amount / eth_usdt[i] * eth_btc[i] * btc_usdt[i] * fee3 - amount
+
 class CryptoArbitrageTrader:
     def __init__(self, symbols: List[str], timeframe: str = "1h", 
                  since: datetime.datetime = datetime.datetime(2020, 1, 1, tzinfo=UTC),
-                 trading_fee: float = 0.001):  # 0.1% trading fee by default
+                 trading_fee: float = 0.001,  # 0.1% trading fee by default
+                 debug: bool = False):
         self.symbols = symbols
         self.timeframe = timeframe
         self.since = since
         self.trading_fee = trading_fee
-        self.bf_arbitrage = BellmanFordArbitrage(trading_fee=trading_fee)
+        # Per-timestamp debug output, off by default since rates are updated in loops
+        self.debug = debug
         self.data = {}
+        # Close prices of all symbols aligned on one timestamp index (columns = symbols)
+        self.close_mat = pd.DataFrame(columns=symbols)
+        self._pairs = [tuple(symbol.split('/')) for symbol in symbols]
+        # (buy base with quote, sell base for quote) rate keys per symbol
+        self._rate_keys = [((quote, base), (base, quote)) for base, quote in self._pairs]
+        # The pair set never changes, so the graph topology is built once
+        self._edge_keys = [key for keys in self._rate_keys for key in keys]
+        self.bf_arbitrage = BellmanFordArbitrage(trading_fee=trading_fee)
+        self.bf_arbitrage.set_pairs(self._edge_keys)
         self.current_rates = {}
         self.exchange = None
         
@@ -48,6 +71,46 @@ class CryptoArbitrageTrader:
         if self.exchange:
             await self.exchange.close()
             
+    async def _fetch_symbol(self, symbol: str, filename: str):
+        """Download all candles of one symbol and save them to filename"""
+        print(f"Downloading data for {symbol}")
+        since_ts = int(self.since.timestamp() * 1000)
+        
+        # Get all candles, the exchange's rate limiter paces the requests
+        all_ohlcv = []
+        while True:
+            ohlcv = await self.exchange.fetch_ohlcv(
+                symbol=symbol,
+                timeframe=self.timeframe,
+                since=since_ts,
+                limit=1000  # Maximum number of candles per request
+            )
+            
+            if not ohlcv:
+                break
+                
+            all_ohlcv.extend(ohlcv)
+            
+            # Update since_ts for next iteration
+            since_ts = ohlcv[-1][0] + 1
+        
+        if all_ohlcv:
+            # Convert to DataFrame
+            df = pd.DataFrame(
+                all_ohlcv,
+                columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']
+            )
+            # Convert timestamp to timezone-aware datetime
+            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
+            df.set_index('timestamp', inplace=True)
+            
+            # Save to file
+            df.to_parquet(filename, compression='zstd')
+            self.data[symbol] = df[['close']]
+            print(f"Downloaded {len(df)} candles for {symbol}")
+        else:
+            print(f"No data available for {symbol}")
+            
     async def download_data_async(self, exchange: str = "binance", dir: str = "data"):
         """Download historical data for all symbol pairs asynchronously"""
         try:
@@ -56,55 +119,29 @@ class CryptoArbitrageTrader:
             
             await self.initialize_exchange()
             
+            downloads = []
             for symbol in self.symbols:
-                filename = f"{dir}/{exchange}-{symbol.replace('/', '')}-{self.timeframe}.pkl"
+                basename = f"{dir}/{exchange}-{symbol.replace('/', '')}-{self.timeframe}"
+                filename = f"{basename}.parquet"
+                legacy_filename = f"{basename}.pkl"
                 
-                # Skip if file already exists
+                # Convert data pickled by earlier versions once
+                if not os.path.exists(filename) and os.path.exists(legacy_filename):
+                    print(f"Converting legacy pickle data for {symbol}")
+                    pd.read_pickle(legacy_filename).to_parquet(filename, compression='zstd')
+                
+                # Skip if file already exists, only close prices are needed for analysis
                 if os.path.exists(filename):
                     print(f"Loading existing data for {symbol}")
-                    self.data[symbol] = pd.read_pickle(filename)
+                    self.data[symbol] = pd.read_parquet(filename, columns=['close'])
                     continue
                 
-                print(f"Downloading data for {symbol}")
-                since_ts = int(self.since.timestamp() * 1000)
-                
-                # Get all candles
-                all_ohlcv = []
-                while True:
-                    ohlcv = await self.exchange.fetch_ohlcv(
-                        symbol=symbol,
-                        timeframe=self.timeframe,
-                        since=since_ts,
-                        limit=1000  # Maximum number of candles per request
-                    )
-                    
-                    if not ohlcv:
-                        break
-                        
-                    all_ohlcv.extend(ohlcv)
-                    
-                    # Update since_ts for next iteration
-                    since_ts = ohlcv[-1][0] + 1
-                    
-                    # Add delay to avoid rate limits
-                    await asyncio.sleep(1)
-                
-                if all_ohlcv:
-                    # Convert to DataFrame
-                    df = pd.DataFrame(
-                        all_ohlcv,
-                        columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']
-                    )
-                    # Convert timestamp to timezone-aware datetime
-                    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
-                    df.set_index('timestamp', inplace=True)
-                    
-                    # Save to file
-                    df.to_pickle(filename)
-                    self.data[symbol] = df
-                    print(f"Downloaded {len(df)} candles for {symbol}")
-                else:
-                    print(f"No data available for {symbol}")
+                downloads.append(self._fetch_symbol(symbol, filename))
+            
+            # Fetch all missing symbols concurrently
+            await asyncio.gather(*downloads)
+            
+            self.build_close_matrix()
                 
         finally:
             await self.close_exchange()
@@ -113,31 +150,41 @@ class CryptoArbitrageTrader:
         """Synchronous wrapper for download_data_async"""
         asyncio.run(self.download_data_async(exchange, dir))
             
+    def build_close_matrix(self):
+        """Align close prices of all downloaded symbols on a common timestamp index"""
+        closes = {symbol: df['close'] for symbol, df in self.data.items()}
+        if closes:
+            self.close_mat = pd.concat(closes, axis=1).reindex(columns=self.symbols)
+        else:
+            self.close_mat = pd.DataFrame(columns=self.symbols)
+            
     def update_exchange_rates(self, timestamp: pd.Timestamp) -> Dict[Tuple[str, str], float]:
         """Update current exchange rates based on timestamp"""
         self.current_rates = {}
+        if timestamp not in self.close_mat.index:
+            return self.current_rates
         
-        for symbol in self.symbols:
-            base, quote = symbol.split('/')
-            
-            # Get current price
-            current_data = self.data[symbol].loc[self.data[symbol].index == timestamp]
-            if not current_data.empty:
-                price = current_data['close'].iloc[0]
-                print(f"Debug: {symbol} price at {timestamp}: {price}")
-                
+        # Single hash lookup for the prices of all symbols
+        prices = self.close_mat.loc[timestamp].to_numpy()
+        
+        for symbol, (buy_key, sell_key), price in zip(self.symbols, self._rate_keys, prices):
+            # Skip symbols without a candle at this timestamp
+            if not np.isnan(price):
                 # Add direct rate
-                self.current_rates[(quote, base)] = 1.0 / price  # Buy base with quote
-                self.current_rates[(base, quote)] = price        # Sell base for quote
+                self.current_rates[buy_key] = 1.0 / price  # Buy base with quote
+                self.current_rates[sell_key] = price       # Sell base for quote
                 
-                print(f"Debug: Rate {quote}->{base}: {self.current_rates[(quote, base)]}")
-                print(f"Debug: Rate {base}->{quote}: {self.current_rates[(base, quote)]}")
+                if self.debug:
+                    print(f"Debug: {symbol} price at {timestamp}: {price}")
+                    print(f"Debug: Rate {buy_key[0]}->{buy_key[1]}: {self.current_rates[buy_key]}")
+                    print(f"Debug: Rate {sell_key[0]}->{sell_key[1]}: {self.current_rates[sell_key]}")
     
         return self.current_rates
     
     def find_arbitrage_opportunity(self, start_currency: str = "USDT") -> Tuple[bool, List[str], float]:
         """Find arbitrage opportunity in current rates"""
-        self.bf_arbitrage.create_graph(self.current_rates)
+        # Symbols without a price at this timestamp get no edge
+        self.bf_arbitrage.update_rates([self.current_rates.get(key, 0.0) for key in self._edge_keys])
         return self.bf_arbitrage.find_arbitrage(start_currency)
     
     def analyze_triangle(self, timestamp):
@@ -160,7 +207,7 @@ class CryptoArbitrageTrader:
         # Path 1: USDT -> BTC -> ETH -> USDT
         path1_amount = 1000  # Start with 1000 USDT
         path1_step1 = (path1_amount / btc_usdt_price) * fee  # USDT -> BTC
-        path1_step2 = (path1_step1 * eth_btc_price) * fee    # BTC -> ETH
+        path1_step2 = (path1_step1 / eth_btc_price) * fee    # BTC -> ETH
         path1_step3 = (path1_step2 * eth_usdt_price) * fee   # ETH -> USDT
         path1_profit = path1_step3 - path1_amount
         
@@ -174,7 +221,7 @@ class CryptoArbitrageTrader:
         print(f"\nAnalyzing timestamp: {timestamp}")
         print("\nPath 1: USDT -> BTC -> ETH -> USDT")
         print(f"Step 1: {path1_amount:.4f} USDT -> {path1_step1:.8f} BTC (Rate: {1/btc_usdt_price:.8f})")
-        print(f"Step 2: {path1_step1:.8f} BTC -> {path1_step2:.8f} ETH (Rate: {eth_btc_price:.8f})")
+        print(f"Step 2: {path1_step1:.8f} BTC -> {path1_step2:.8f} ETH (Rate: {1/eth_btc_price:.8f})")
         print(f"Step 3: {path1_step2:.8f} ETH -> {path1_step3:.4f} USDT (Rate: {eth_usdt_price:.8f})")
         print(f"Profit: {path1_profit:.4f} USDT ({(path1_profit/path1_amount)*100:.4f}%)")
         
@@ -183,6 +230,66 @@ class CryptoArbitrageTrader:
         print(f"Step 2: {path2_step1:.8f} ETH -> {path2_step2:.8f} BTC (Rate: {eth_btc_price:.8f})")
         print(f"Step 3: {path2_step2:.8f} BTC -> {path2_step3:.4f} USDT (Rate: {btc_usdt_price:.8f})")
         print(f"Profit: {path2_profit:.4f} USDT ({(path2_profit/path2_amount)*100:.4f}%)")
+    
+    def analyze_timerange(self, start_time: pd.Timestamp, end_time: pd.Timestamp,
+                          interval: str = "1h") -> pd.DataFrame:
+        """
+        Analyze triangular arbitrage for every timestamp in a range at once.
+        Both paths of analyze_triangle are evaluated by a parallel kernel over all timestamps.
+        Returns: DataFrame of path profits (USDT per 1000 USDT) for the profitable timestamps
+        """
+        # Only timestamps with candles, so no lookup has to handle a missing row
+        times = pd.date_range(start_time, end_time, freq=interval).intersection(self.close_mat.index)
+        prices = self.close_mat.loc[times]
+        btc_usdt = prices["BTC/USDT"].to_numpy(dtype=np.float64)
+        eth_usdt = prices["ETH/USDT"].to_numpy(dtype=np.float64)
+        eth_btc = prices["ETH/BTC"].to_numpy(dtype=np.float64)
+        
+        fee = 1 - self.trading_fee
+        amount = 1000  # Start with 1000 USDT
+        
+        path1_profit = np.empty(len(times))
+        path2_profit = np.empty(len(times))
+        _scan_triangles(btc_usdt, eth_usdt, eth_btc, fee, amount, path1_profit, path2_profit)
+        
+        profitable = (path1_profit > 0) | (path2_profit > 0)
+        opportunities = pd.DataFrame(
+            {'path1_profit': path1_profit[profitable], 'path2_profit': path2_profit[profitable]},
+            index=times[profitable]
+        )
+        
+        print(f"\nAnalyzed {len(times)} timestamps from {start_time} to {end_time}")
+        if np.isnan(path1_profit).all():
+            print("No price data in range")
+            return opportunities
+        print(f"Profitable timestamps: {len(opportunities)}")
+        for name, profit in (("Path 1: USDT -> BTC -> ETH -> USDT", path1_profit),
+                             ("Path 2: USDT -> ETH -> BTC -> USDT", path2_profit)):
+            best = np.nanargmax(profit)
+            print(f"Best {name} at {times[best]}: "
+                  f"{profit[best]:.4f} USDT ({(profit[best]/amount)*100:.4f}%)")
+        
+        return opportunities
+    
+    def analyze_cycles(self, start_currency: str = "USDT", length: int = 3) -> pd.Series:
+        """
+        Analyze cycle arbitrage of the given length through start_currency for every timestamp at once.
+        Works on all downloaded symbols, not just the BTC/ETH/USDT triangle.
+        Returns: Series of the best cycle profit ratio per timestamp (> 1 means arbitrage)
+        """
+        currencies, log_rates = self.bf_arbitrage.create_log_rate_tensor(
+            self.close_mat.to_numpy(dtype=np.float64), self._pairs
+        )
+        if start_currency not in currencies:
+            return pd.Series(dtype=np.float64)
+        
+        costs = self.bf_arbitrage.min_cycle_costs(log_rates, currencies.index(start_currency), length)
+        # Tensor math runs in float32, report in float64
+        profit_ratios = pd.Series(np.exp(-costs.astype(np.float64)), index=self.close_mat.index)
+        
+        print(f"\n{length}-cycles through {start_currency}: "
+              f"{int((costs < 0).sum())} of {len(costs)} timestamps with arbitrage")
+        return profit_ratios
 
 def main():
     # Initialize with the trading pairs you want to monitor
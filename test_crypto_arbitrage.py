@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+from crypto_arbitrage import CryptoArbitrageTrader
+
+
+def make_trader(periods: int = 200) -> CryptoArbitrageTrader:
+    """Trader with synthetic hourly candles whose triangle drifts around parity"""
+    trader = CryptoArbitrageTrader(["BTC/USDT", "ETH/USDT", "ETH/BTC"])
+    index = pd.date_range("2022-11-01", periods=periods, freq="1h", tz="UTC", name="timestamp")
+    rng = np.random.default_rng(0)
+    btc_usdt = 16000 * np.exp(np.cumsum(rng.normal(0, 0.005, periods)))
+    eth_btc = 0.07 * np.exp(np.cumsum(rng.normal(0, 0.005, periods)))
+    eth_usdt = btc_usdt * eth_btc * np.exp(rng.normal(0, 0.004, periods))
+    for symbol, close in (("BTC/USDT", btc_usdt), ("ETH/USDT", eth_usdt), ("ETH/BTC", eth_btc)):
+        trader.data[symbol] = pd.DataFrame({'close': close}, index=index)
+    trader.build_close_matrix()
+    return trader
+
+
+def test_analyze_timerange_matches_analyze_cycles():
+    trader = make_trader()
+    index = trader.close_mat.index
+
+    opportunities = trader.analyze_timerange(index[0], index[-1])
+    profit_ratios = trader.analyze_cycles("USDT", length=3)
+
+    assert len(opportunities) > 0
+    assert opportunities.index.equals(profit_ratios.index[profit_ratios > 1])
+    # Path 1 is the reverse triangle, so it must be profitable somewhere too
+    assert (opportunities['path1_profit'] > 0).any()